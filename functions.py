@@ -3,7 +3,9 @@ import numpy as np
 import plotly.graph_objs as go
 import plotly.express as px
 import os
+import sqlite3
 import webbrowser
+from collections import deque
 import easygui as g
 
 
@@ -43,6 +45,31 @@ baseball_cols = [
 ]
 
 
+session_cols = ['Pitch_Type', 'Date', 'Athlete_Name']
+
+sql_table = 'pitches'
+
+sql_cols = baseball_cols + ['pitch_start_y', 'pitch_start_x']
+
+agg_meth_dict = {
+    'Mean': 'mean',
+    'Min': 'min',
+    'Max': 'max',
+    'Median': 'median',
+    'Q25': lambda x: x.quantile(.25),
+    'Q75': lambda x: x.quantile(.75)
+}
+
+sql_agg_dict = {
+    'Mean': 'AVG',
+    'Min': 'MIN',
+    'Max': 'MAX',
+    'Median': 0.5,
+    'Q25': 0.25,
+    'Q75': 0.75
+}
+
+
 def blank_graph(error_message: str) -> go.Figure:
     res = {
         "layout": {
@@ -104,7 +131,219 @@ def calculated_columns(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+def build_database(csv_filename: str = "pitch_database.csv", db_filename: str = "pitch_database.db",
+                   chunksize: int = 10000) -> sqlite3.Connection:
+    # Build into a temp file so a failed build never leaves a broken database behind
+    tmp_filename = db_filename + ".tmp"
+    if os.path.exists(tmp_filename):
+        os.remove(tmp_filename)
+
+    con = sqlite3.connect(tmp_filename)
+
+    # Load in chunks so the csv never has to be fully resident
+    for chunk in pd.read_csv(csv_filename, chunksize=chunksize):
+        if not validate_data(chunk):
+            con.close()
+            os.remove(tmp_filename)
+            return None
+
+        chunk = calculated_columns(chunk)
+        chunk['Date'] = chunk['Date'].dt.strftime('%Y-%m-%d')
+        chunk.to_sql(sql_table, con, if_exists='append', index=False)
+
+    con.execute(f'CREATE INDEX IF NOT EXISTS idx_{sql_table}_session ON {sql_table} ({", ".join(session_cols)})')
+    con.commit()
+    con.close()
+
+    os.replace(tmp_filename, db_filename)
+
+    return sqlite3.connect(db_filename, check_same_thread=False)
+
+
+def database_stale(db_filename: str, csv_filename: str) -> bool:
+    if not os.path.exists(db_filename):
+        return True
+
+    # Without the csv the database is all there is, so only check it has the table
+    if os.path.exists(csv_filename) and os.path.getmtime(csv_filename) > os.path.getmtime(db_filename):
+        return True
+
+    con = sqlite3.connect(db_filename)
+    res = con.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (sql_table,)).fetchone()
+    con.close()
+
+    return res is None
+
+
+def get_connection(db_filename: str = "pitch_database.db", csv_filename: str = "pitch_database.csv") -> sqlite3.Connection:
+    if database_stale(db_filename, csv_filename):
+        return build_database(csv_filename, db_filename)
+
+    return sqlite3.connect(db_filename, check_same_thread=False)
+
+
+def get_pitch_types(data) -> list:
+    if isinstance(data, sqlite3.Connection):
+        res = data.execute(f'SELECT Pitch_Type FROM {sql_table} GROUP BY Pitch_Type ORDER BY MIN(rowid)')
+        return [row[0] for row in res.fetchall()]
+
+    return data['Pitch_Type'].unique()
+
+
+def check_sql_cols(cols: list):
+    for col in cols:
+        if col not in sql_cols:
+            raise ValueError(f"Unknown column: {col}")
+
+
+def sql_filter(pitch_types=None, dates=None, athletes=None) -> (str, list):
+    clauses = ['1 = 1']
+    params = []
+
+    for col, values in (('Pitch_Type', pitch_types), ('Date', dates), ('Athlete_Name', athletes)):
+        if values is None:
+            continue
+
+        values = list(values)
+        if col == 'Date':
+            values = [pd.to_datetime(x).strftime('%Y-%m-%d') for x in values]
+
+        if len(values) == 0:
+            clauses.append('0 = 1')
+        else:
+            clauses.append(f'{col} IN ({", ".join("?" * len(values))})')
+            params += values
+
+    return ' AND '.join(clauses), params
+
+
+def sql_quantile(col: str, q: float, group_cols: list, where_sql: str) -> str:
+    # Matches pandas' default linear interpolation between the closest ranks
+    keys = ', '.join(group_cols)
+    pos = f'(n - 1) * {q}'
+    lo = f'CAST({pos} AS INTEGER)'
+
+    return f"""
+        SELECT
+            {keys},
+            CASE
+                WHEN pos - lo < 0.5 THEN v_lo + (pos - lo) * (v_hi - v_lo)
+                ELSE v_hi - (1 - (pos - lo)) * (v_hi - v_lo)
+            END AS val
+        FROM (
+            SELECT
+                {keys},
+                MAX({pos}) AS pos,
+                MAX({lo}) AS lo,
+                MAX(CASE WHEN rn = {lo} THEN v END) AS v_lo,
+                MAX(CASE WHEN rn = MIN({lo} + 1, n - 1) THEN v END) AS v_hi
+            FROM (
+                SELECT
+                    {keys},
+                    {col} AS v,
+                    ROW_NUMBER() OVER (PARTITION BY {keys} ORDER BY {col}) - 1 AS rn,
+                    COUNT(*) OVER (PARTITION BY {keys}) AS n
+                FROM {sql_table}
+                WHERE {where_sql} AND {col} IS NOT NULL
+            )
+            GROUP BY {keys}
+        )
+    """
+
+
+def query_session_agg(con: sqlite3.Connection, aggs: dict, pitch_types=None, group_cols: list = session_cols,
+                      dates=None, athletes=None) -> pd.DataFrame:
+    """aggs maps output column name -> (source column, key of sql_agg_dict)"""
+    check_sql_cols(group_cols + [col for col, _ in aggs.values()])
+
+    where_sql, where_params = sql_filter(pitch_types, dates, athletes)
+    keys = ', '.join(group_cols)
+
+    simple_aggs = []
+    quant_joins = []
+    params = list(where_params)
+    names = {}
+
+    for i, (name, (col, stat)) in enumerate(aggs.items()):
+        names[f'a{i}'] = name
+        func = sql_agg_dict[stat]
+
+        if isinstance(func, str):
+            simple_aggs.append(f'{func}({col}) AS a{i}')
+        else:
+            quant_joins.append((f'a{i}', sql_quantile(col, func, group_cols, where_sql)))
+            params += where_params
+
+    base_sql = f"SELECT {', '.join([keys] + simple_aggs)} FROM {sql_table} WHERE {where_sql} GROUP BY {keys}"
+
+    select = [f'b.{x}' for x in group_cols] + [f'b.{x.split(" AS ")[1]}' for x in simple_aggs]
+    joins = []
+    for alias, quant_sql in quant_joins:
+        on = ' AND '.join(f'b.{x} IS {alias}_q.{x}' for x in group_cols)
+        select.append(f'{alias}_q.val AS {alias}')
+        joins.append(f'LEFT JOIN ({quant_sql}) AS {alias}_q ON {on}')
+
+    query = f"""
+        SELECT {', '.join(select)}
+        FROM ({base_sql}) AS b
+        {' '.join(joins)}
+        ORDER BY {', '.join(f'b.{x}' for x in group_cols)}
+    """
+
+    res = pd.read_sql_query(query, con, params=params).rename(columns=names)
+    res = res[group_cols + list(aggs)]
+    if 'Date' in res.columns:
+        res['Date'] = pd.to_datetime(res['Date'])
+
+    return res
+
+
+def query_pitches(con: sqlite3.Connection, cols: list, pitch_types=None, dates=None, athletes=None) -> pd.DataFrame:
+    check_sql_cols(cols)
+
+    where_sql, params = sql_filter(pitch_types, dates, athletes)
+
+    res = pd.read_sql_query(
+        f"SELECT {', '.join(cols)} FROM {sql_table} WHERE {where_sql} ORDER BY rowid",
+        con,
+        params=params
+    )
+    if 'Date' in res.columns:
+        res['Date'] = pd.to_datetime(res['Date'])
+
+    return res
+
+
+def session_agg(data, aggs: dict, pitch_types, stat: str, group_cols: list = session_cols) -> pd.DataFrame:
+    """aggs maps output column name -> source column, aggregated per session with stat
+
+    stat is a key of agg_meth_dict/sql_agg_dict so both backends compute the same thing
+    """
+    if isinstance(data, sqlite3.Connection):
+        return query_session_agg(data, {name: (col, stat) for name, col in aggs.items()}, pitch_types, group_cols)
+
+    return (
+        data
+        .loc[data['Pitch_Type'].isin(pitch_types), :]
+        .groupby(group_cols)
+        .agg(**{name: (col, agg_meth_dict[stat]) for name, col in aggs.items()})
+        .reset_index()
+    )
+
+
 def var_stat(df: pd.DataFrame, col: str) -> pd.DataFrame:
+    if isinstance(df, sqlite3.Connection):
+        stats = [('avg', 'Mean'), ('min', 'Min'), ('q25', 'Q25'), ('median', 'Median'), ('q75', 'Q75'), ('max', 'Max')]
+
+        return (
+            query_session_agg(
+                df,
+                {f'{col}_{suffix}': (col, stat) for suffix, stat in stats},
+                group_cols=['Date', 'Athlete_Name', 'Pitch_Type']
+            )
+            .set_index(['Date', 'Athlete_Name', 'Pitch_Type'])
+        )
+
     tmp = (
         df
         .groupby(['Date', 'Athlete_Name', 'Pitch_Type'])
@@ -140,27 +379,25 @@ def all_equal(a: list, b: list) -> bool:
     return True
 
 
-def plot_break_graph(df: pd.DataFrame, pitches_selected, agg_method, agg_label, template: str = "flatly") -> go.Figure:
+def plot_break_graph(df: pd.DataFrame, pitches_selected, agg_label, template: str = "flatly") -> go.Figure:
 
     if pitches_selected is None or len(pitches_selected) == 0:
         return blank_graph("Select a Pitch Type")
 
-    if agg_method is None:
+    if agg_label is None:
         return blank_graph("Select Aggregation Statistic")
 
     pitches_selected = sorted(pitches_selected)
 
-    tmp_df = (
-        df
-        .loc[df['Pitch_Type'].isin(pitches_selected), :]
-        .groupby(['Date', 'Pitch_Type', 'Athlete_Name'])
-        .agg(
-            hoz_use_val = ('Horizontal_Break_Inches', agg_method),
-            vert_use_val = ('Vertical_Break_Inches', agg_method),
-        )
-        .rename(columns={'hoz_use_val': f'{agg_label} Horizontal Break'})
-        .rename(columns={'vert_use_val': f'{agg_label} Vertical Break'})
-        .reset_index()
+    tmp_df = session_agg(
+        df,
+        {
+            f'{agg_label} Horizontal Break': 'Horizontal_Break_Inches',
+            f'{agg_label} Vertical Break': 'Vertical_Break_Inches'
+        },
+        pitches_selected,
+        agg_label,
+        ['Date', 'Pitch_Type', 'Athlete_Name']
     )
 
     fig = go.Figure()
@@ -214,6 +451,13 @@ def highlight_plot_break(df: pd.DataFrame, pitches_selected, cust_data=None, tem
 
     pitches_selected = sorted(pitches_selected)
 
+    if isinstance(df, sqlite3.Connection):
+        df = query_pitches(
+            df,
+            ['Date', 'Athlete_Name', 'Pitch_Type', 'Horizontal_Break_Inches', 'Vertical_Break_Inches'],
+            pitches_selected
+        )
+
     if cust_data is None:
         tmp_dfs_yes_dates = df.loc[(df['Pitch_Type'].isin(pitches_selected)), :]
 
@@ -294,33 +538,173 @@ def highlight_plot_break(df: pd.DataFrame, pitches_selected, cust_data=None, tem
     return fig
 
 
-def plot_avg_velo(df, pitch_types, agg_method, agg_label, template: str = "flatly"):
+class RollingTrend:
+    """Rolling mean/std over the last `window` sessions or `days` days
+
+    Appending a session adds it to the running mean/variance (Welford) and
+    removes whatever fell out of the window, the rest of the window is never
+    recomputed. The dashboard loads its data once and has no append path yet,
+    so it only uses this through rolling_trend. A live feed can keep one per
+    (Pitch_Type, Athlete_Name) and append each new session to it.
+    """
+
+    def __init__(self, window: int = None, days: int = None):
+        self.window = window
+        self.days = days
+        self.values = deque()
+        self.count = 0
+        self.mean_val = 0.0
+        self.m2 = 0.0
+
+    def _add(self, value: float):
+        if pd.isna(value):
+            return
+
+        self.count += 1
+        delta = value - self.mean_val
+        self.mean_val += delta / self.count
+        self.m2 += delta * (value - self.mean_val)
+
+    def _remove(self, value: float):
+        if pd.isna(value):
+            return
+
+        self.count -= 1
+        if self.count == 0:
+            self.mean_val = 0.0
+            self.m2 = 0.0
+            return
+
+        delta = value - self.mean_val
+        self.mean_val -= delta / self.count
+        self.m2 = max(0.0, self.m2 - delta * (value - self.mean_val))
+
+    def append(self, date, value: float) -> (float, float):
+        date = pd.to_datetime(date)
+
+        self.values.append((date, value))
+        self._add(value)
+
+        while (
+            (self.days is not None and self.values[0][0] <= date - pd.Timedelta(days=self.days)) or
+            (self.window is not None and len(self.values) > self.window)
+        ):
+            self._remove(self.values.popleft()[1])
+
+        return self.mean, self.std
+
+    @property
+    def mean(self) -> float:
+        if self.count == 0:
+            return np.nan
+
+        return self.mean_val
+
+    @property
+    def std(self) -> float:
+        if self.count < 2:
+            return np.nan
+
+        return np.sqrt(self.m2 / (self.count - 1))
+
+
+def rolling_trend(df: pd.DataFrame, col: str, window: int = None, days: int = None) -> pd.DataFrame:
+    """Rolling mean/std of per-session aggregates, by number of sessions or by days
+
+    Replays each (Pitch_Type, Athlete_Name) history through a new RollingTrend on
+    every call, nothing is kept between calls.
+    """
+    res = []
+
+    for _, tmp in df.sort_values('Date', kind='stable').groupby(['Pitch_Type', 'Athlete_Name']):
+        trend = RollingTrend(window, days)
+        stats = [trend.append(date, value) for date, value in zip(tmp['Date'], tmp[col])]
+
+        res.append(tmp.assign(**{
+            col + '_trend_mean': [mean for mean, _ in stats],
+            col + '_trend_std': [std for _, std in stats]
+        }))
+
+    if len(res) == 0:
+        return df.assign(**{col + '_trend_mean': np.nan, col + '_trend_std': np.nan})
+
+    return pd.concat(res)
+
+
+def add_trend_lines(fig: go.Figure, tmp_data: pd.DataFrame, col: str, trend_window: int = None,
+                    trend_days: int = None) -> go.Figure:
+
+    if trend_window is None and trend_days is None:
+        return fig
+
+    if trend_days is not None:
+        trend_label = f'{trend_days} Day'
+    else:
+        trend_label = f'{trend_window} Session'
+
+    trend = rolling_trend(tmp_data, col, trend_window, trend_days)
+
+    for (pitch_type, athlete), tmp in trend.groupby(['Pitch_Type', 'Athlete_Name']):
+        color = pitch_colors[pitch_type]
+        spread = tmp[col + '_trend_std'].fillna(0)
+
+        fig.add_scatter(
+            x=tmp['Date'],
+            y=tmp[col + '_trend_mean'] + spread,
+            legendgroup=pitch_type,
+            showlegend=False,
+            line={'color': color, 'width': 0},
+            mode="lines",
+            hoverinfo='skip'
+        )
+        fig.add_scatter(
+            x=tmp['Date'],
+            y=tmp[col + '_trend_mean'] - spread,
+            legendgroup=pitch_type,
+            showlegend=False,
+            line={'color': color, 'width': 0},
+            fill='tonexty',
+            opacity=0.2,
+            mode="lines",
+            hoverinfo='skip'
+        )
+        fig.add_scatter(
+            x=tmp['Date'],
+            y=tmp[col + '_trend_mean'],
+            name=f'{pitch_type} {trend_label} Trend ({athlete})',
+            legendgroup=pitch_type,
+            customdata=tmp[['Date', 'Athlete_Name', 'Pitch_Type']].to_numpy(),
+            line={'color': color, 'dash': 'dot'},
+            mode="lines",
+            hovertemplate=f'<br>Athlete: {athlete}<br>{trend_label} Trend: %{{y:.1f}}'
+        )
+
+    return fig
+
+
+def plot_avg_velo(df, pitch_types, agg_label, template: str = "flatly", trend_window: int = None,
+                  trend_days: int = None):
 
     if pitch_types is None:
         return blank_graph("Select a Pitch Type")
 
-    if agg_method is None:
+    if agg_label is None:
         return blank_graph("Select a Aggregation Statistic")
 
-    tmp_data = (
-        df.loc[df['Pitch_Type'].isin(pitch_types), :]
-        .groupby(['Pitch_Type', 'Date', 'Athlete_Name'])
-        .agg(
-            mph_use=('MPH', agg_method),
-        )
-        .rename(columns={'mph_use': f'{agg_label} MPH'})
-        .reset_index()
-    )
+    tmp_data = session_agg(df, {f'{agg_label} MPH': 'MPH'}, pitch_types, agg_label)
 
     fig = px.line(
         tmp_data,
         x='Date',
         y=f'{agg_label} MPH',
         color='Pitch_Type',
+        color_discrete_map=pitch_colors,
         markers=True,
         custom_data=['Date', 'Athlete_Name', 'Pitch_Type']
     )
 
+    add_trend_lines(fig, tmp_data, f'{agg_label} MPH', trend_window, trend_days)
+
     fig.update_layout(
         title=f"Session {agg_label} MPH",
         xaxis_title="Session Date",
@@ -342,6 +726,9 @@ def velo_highlight_plot(df: pd.DataFrame, pitches_selected, cust_data=None, temp
     date_selected = cust_data[0]
     pitch_type_selected = cust_data[2]
 
+    if isinstance(df, sqlite3.Connection):
+        df = query_pitches(df, ['Date', 'Athlete_Name', 'Pitch_Type', 'MPH'], pitches_selected, [date_selected])
+
     tmp_df = df.loc[
                            (
                                (df['Pitch_Type'].isin(pitches_selected)) &
@@ -362,6 +749,179 @@ def velo_highlight_plot(df: pd.DataFrame, pitches_selected, cust_data=None, temp
     return fig
 
 
+class FatigueDetector:
+    """Online per-session drop detector, updated in O(1) per pitch
+
+    The first `warmup` pitches set the baseline mean/variance (Welford), after
+    that a one-sided CUSUM on the standardized value flags sustained drops.
+    """
+
+    def __init__(self, warmup: int = 5, k: float = 0.5, h: float = 4.0):
+        self.warmup = warmup
+        self.k = k
+        self.h = h
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.z = np.nan
+        self.cusum = 0.0
+
+    @property
+    def std(self) -> float:
+        if self.n < 2:
+            return np.nan
+
+        return np.sqrt(self.m2 / (self.n - 1))
+
+    @property
+    def fatigued(self) -> bool:
+        return self.cusum > self.h
+
+    def update(self, x: float) -> bool:
+        self.z = np.nan
+
+        if pd.isna(x):
+            return self.fatigued
+
+        if self.n < self.warmup:
+            self.n += 1
+            delta = x - self.mean
+            self.mean += delta / self.n
+            self.m2 += delta * (x - self.mean)
+            return self.fatigued
+
+        if self.std > 0:
+            self.z = (x - self.mean) / self.std
+            self.cusum = max(0.0, self.cusum - self.z - self.k)
+
+        return self.fatigued
+
+
+def order_pitches(df: pd.DataFrame) -> pd.DataFrame:
+    """Number pitches by their place in the whole (Date, Athlete_Name) session
+
+    Pass the full session, numbering after filtering by pitch type would drop the
+    other pitches from the count. Pitch_Count is used where the session recorded
+    it, file order only for sessions that did not.
+    """
+    sessions = [df['Date'], df['Athlete_Name']]
+    file_order = df.groupby(sessions).cumcount() + 1
+
+    # sqlite hands back an all NULL column as object dtype
+    pitch_count = pd.to_numeric(df['Pitch_Count'])
+    has_count = pitch_count.notna().groupby(sessions).transform('any')
+
+    tmp = df.assign(Pitch_Number=pitch_count.where(has_count, file_order).astype(float))
+
+    return tmp.sort_values(['Date', 'Athlete_Name', 'Pitch_Number'], kind='stable', na_position='last')
+
+
+def fatigue_stats(df: pd.DataFrame, col: str, warmup: int = 5, k: float = 0.5, h: float = 4.0) -> pd.DataFrame:
+    """Vectorized equivalent of running FatigueDetector over every session"""
+    tmp = order_pitches(df)
+    groups = [tmp[x] for x in session_cols]
+
+    valid = tmp[col].notna()
+    n = valid.groupby(groups).cumsum()
+    in_warmup = valid & (n <= warmup)
+    active = valid & (n > warmup)
+
+    warmup_vals = tmp[col].where(in_warmup).groupby(groups)
+    baseline = warmup_vals.transform('mean')
+    std = warmup_vals.transform('std')
+    std = std.where(std > 0)
+
+    z = ((tmp[col] - baseline) / std).where(active)
+
+    # CUSUM S_t = max(0, S_t-1 + d_t) is the cumulative sum less its running minimum
+    c = (-z - k).fillna(0).groupby(groups).cumsum()
+    cusum = c - c.groupby(groups).cummin().clip(upper=0)
+
+    tmp[col + '_baseline'] = baseline
+    tmp[col + '_z'] = z
+    tmp[col + '_cusum'] = cusum
+    tmp[col + '_fatigue'] = cusum > h
+
+    return tmp
+
+
+def plot_velo_fatigue(df: pd.DataFrame, pitches_selected, cust_data=None, col: str = 'MPH',
+                      template: str = "flatly") -> go.Figure:
+
+    if pitches_selected is None or cust_data is None:
+        return blank_graph("Select a Pitch Type")
+
+    if col is None:
+        return blank_graph("Select a Metric")
+
+    pitches_selected = sorted(pitches_selected)
+
+    date_selected = cust_data[0]
+    athlete_selected = cust_data[1]
+
+    # Query the whole session so pitches keep their place in it, then filter by pitch type
+    if isinstance(df, sqlite3.Connection):
+        tmp_df = query_pitches(
+            df,
+            ['Date', 'Athlete_Name', 'Pitch_Type', 'Pitch_Count', col],
+            dates=[date_selected],
+            athletes=[athlete_selected]
+        )
+    else:
+        tmp_df = df.loc[
+                               (df['Date'] == date_selected) &
+                               (df['Athlete_Name'] == athlete_selected)
+        , :]
+
+    tmp_df = fatigue_stats(tmp_df, col)
+    tmp_df = tmp_df.loc[tmp_df['Pitch_Type'].isin(pitches_selected), :]
+    label = col.replace('_', ' ')
+
+    fig = go.Figure()
+
+    for i in range(len(pitches_selected)):
+        tmp_dfs = tmp_df.loc[tmp_df['Pitch_Type'] == pitches_selected[i], :]
+        flagged = tmp_dfs.loc[tmp_dfs[col + '_fatigue'], :]
+
+        fig.add_scatter(
+            x=tmp_dfs['Pitch_Number'],
+            y=tmp_dfs[col],
+            name=pitches_selected[i],
+            legendgroup=pitches_selected[i],
+            marker={'color': pitch_colors[pitches_selected[i]]},
+            mode="lines+markers"
+        )
+        fig.add_scatter(
+            x=tmp_dfs['Pitch_Number'],
+            y=tmp_dfs[col + '_baseline'],
+            name=f'{pitches_selected[i]} Baseline',
+            legendgroup=pitches_selected[i],
+            showlegend=False,
+            line={'color': pitch_colors[pitches_selected[i]], 'dash': 'dash'},
+            mode="lines",
+            hoverinfo='skip'
+        )
+        fig.add_scatter(
+            x=flagged['Pitch_Number'],
+            y=flagged[col],
+            name=f'{pitches_selected[i]} Fatigue',
+            legendgroup=pitches_selected[i],
+            showlegend=False,
+            marker={'color': 'red', 'symbol': 'x', 'size': 10},
+            mode="markers"
+        )
+
+    fig.update_layout(
+        title=f"Session {label} Fatigue",
+        xaxis_title="Pitch Number",
+        yaxis_title=label,
+        legend_title="Pitch Types",
+        template=template
+    )
+
+    return fig
+
+
 def open_browser():
     if not os.environ.get("WERKZEUG_RUN_MAIN"):
         webbrowser.open_new('http://127.0.0.1:1222/')
@@ -380,33 +940,29 @@ def flatten_list(_2d_list):
     return flat_list
 
 
-def plot_tot_spin(df, pitch_types, agg_method, agg_label, template: str = "flatly"):
+def plot_tot_spin(df, pitch_types, agg_label, template: str = "flatly", trend_window: int = None,
+                  trend_days: int = None):
 
     if pitch_types is None:
         return blank_graph("Select a Pitch Type")
 
-    if agg_method is None:
+    if agg_label is None:
         return blank_graph("Select a Aggregation Statistic")
 
-    tmp_data = (
-        df.loc[df['Pitch_Type'].isin(pitch_types), :]
-        .groupby(['Pitch_Type', 'Date', 'Athlete_Name'])
-        .agg(
-            spin_use=('Total_Spin', agg_method),
-        )
-        .rename(columns={'spin_use': f'{agg_label} Total Spin'})
-        .reset_index()
-    )
+    tmp_data = session_agg(df, {f'{agg_label} Total Spin': 'Total_Spin'}, pitch_types, agg_label)
 
     fig = px.line(
         tmp_data,
         x='Date',
         y=f'{agg_label} Total Spin',
         color='Pitch_Type',
+        color_discrete_map=pitch_colors,
         markers=True,
         custom_data=['Date', 'Athlete_Name', 'Pitch_Type']
     )
 
+    add_trend_lines(fig, tmp_data, f'{agg_label} Total Spin', trend_window, trend_days)
+
     fig.update_layout(
         title=f"Session {agg_label} Total Spin",
         xaxis_title="Session Date",
@@ -417,33 +973,29 @@ def plot_tot_spin(df, pitch_types, agg_method, agg_label, template: str = "flatl
 
     return fig
 
-def plot_true_spin(df, pitch_types, agg_method, agg_label, template: str = "flatly"):
+def plot_true_spin(df, pitch_types, agg_label, template: str = "flatly", trend_window: int = None,
+                   trend_days: int = None):
 
     if pitch_types is None:
         return blank_graph("Select a Pitch Type")
 
-    if agg_method is None:
+    if agg_label is None:
         return blank_graph("Select a Aggregation Statistic")
 
-    tmp_data = (
-        df.loc[df['Pitch_Type'].isin(pitch_types), :]
-        .groupby(['Pitch_Type', 'Date', 'Athlete_Name'])
-        .agg(
-            spin_use=('True_Spin', agg_method),
-        )
-        .rename(columns={'spin_use': f'{agg_label} True Spin'})
-        .reset_index()
-    )
+    tmp_data = session_agg(df, {f'{agg_label} True Spin': 'True_Spin'}, pitch_types, agg_label)
 
     fig = px.line(
         tmp_data,
         x='Date',
         y=f'{agg_label} True Spin',
         color='Pitch_Type',
+        color_discrete_map=pitch_colors,
         markers=True,
         custom_data=['Date', 'Athlete_Name', 'Pitch_Type']
     )
 
+    add_trend_lines(fig, tmp_data, f'{agg_label} True Spin', trend_window, trend_days)
+
     fig.update_layout(
         title=f"Session {agg_label} True Spin",
         xaxis_title="Session Date",
@@ -455,33 +1007,29 @@ def plot_true_spin(df, pitch_types, agg_method, agg_label, template: str = "flat
     return fig
 
 
-def plot_eff_spin(df, pitch_types, agg_method, agg_label, template: str = "flatly"):
+def plot_eff_spin(df, pitch_types, agg_label, template: str = "flatly", trend_window: int = None,
+                  trend_days: int = None):
 
     if pitch_types is None:
         return blank_graph("Select a Pitch Type")
 
-    if agg_method is None:
+    if agg_label is None:
         return blank_graph("Select a Aggregation Statistic")
 
-    tmp_data = (
-        df.loc[df['Pitch_Type'].isin(pitch_types), :]
-        .groupby(['Pitch_Type', 'Date', 'Athlete_Name'])
-        .agg(
-            spin_use=('Spin_Efficiency', agg_method),
-        )
-        .rename(columns={'spin_use': f'{agg_label} Spin Efficiency'})
-        .reset_index()
-    )
+    tmp_data = session_agg(df, {f'{agg_label} Spin Efficiency': 'Spin_Efficiency'}, pitch_types, agg_label)
 
     fig = px.line(
         tmp_data,
         x='Date',
         y=f'{agg_label} Spin Efficiency',
         color='Pitch_Type',
+        color_discrete_map=pitch_colors,
         markers=True,
         custom_data=['Date', 'Athlete_Name', 'Pitch_Type']
     )
 
+    add_trend_lines(fig, tmp_data, f'{agg_label} Spin Efficiency', trend_window, trend_days)
+
     fig.update_layout(
         title=f"Session {agg_label} Spin Efficiency",
         xaxis_title="Session Date",
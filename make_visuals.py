@@ -1,4 +1,5 @@
 import dash
+import os
 import pandas as pd
 import numpy as np
 import plotly.express as px
@@ -16,15 +17,22 @@ app = Dash(__name__, external_stylesheets=[dbc.themes.FLATLY])
 
 app.title = "Baseball Data Analytics Dashboard"
 
-data = get_data()
-data = data.reset_index()
+# RAPSODO_BACKEND=sql pushes filters and aggregations down to an embedded sqlite database
+# instead of holding the csv in memory
+use_sql_backend = os.environ.get("RAPSODO_BACKEND", "pandas").lower() == "sql"
 
-agg_meth_dict = {
-    'Mean': np.mean,
-    'Min': np.min,
-    'Max': np.max,
-    'Median': np.median,
-    None: None
+if use_sql_backend:
+    data = get_connection()
+else:
+    data = get_data()
+    data = data.reset_index()
+
+trend_window_dict = {
+    'Last 3 Sessions': {'trend_window': 3},
+    'Last 5 Sessions': {'trend_window': 5},
+    'Last 7 Days': {'trend_days': 7},
+    'Last 30 Days': {'trend_days': 30},
+    None: {}
 }
 
 
@@ -34,7 +42,7 @@ agg_meth_dict = {
     Input('statistic_select', 'value'),
 )
 def output_agg_hoz_vert_graph(pitches_selected, agg_label):
-    return plot_break_graph(data, pitches_selected, agg_meth_dict[agg_label], agg_label, template_use)
+    return plot_break_graph(data, pitches_selected, agg_label, template_use)
 
 
 @app.callback(
@@ -54,9 +62,10 @@ def output_hoz_vert_graph(pitches_selected, clicked_info):
     Output('avg_velo', 'figure'),
     Input("pitch_type_select", "value"),
     Input('statistic_select', 'value'),
+    Input('trend_window_select', 'value'),
 )
-def output_avg_velo(pitch_types, agg_label):
-    return plot_avg_velo(data, pitch_types, agg_meth_dict[agg_label], agg_label)
+def output_avg_velo(pitch_types, agg_label, trend_label):
+    return plot_avg_velo(data, pitch_types, agg_label, **trend_window_dict[trend_label])
 
 @app.callback(
     Output('velo', 'figure'),
@@ -71,31 +80,48 @@ def output_hov_velo(pitches_selected, clicked_info):
     return velo_highlight_plot(data, pitches_selected, flatten_list(clicked_info['points'][0]['customdata']))
 
 
+@app.callback(
+    Output('velo_fatigue', 'figure'),
+    Input("pitch_type_select", "value"),
+    Input("avg_velo", "hoverData"),
+    Input('fatigue_metric_select', 'value'),
+)
+def output_velo_fatigue(pitches_selected, clicked_info, fatigue_col):
+    if pitches_selected is None:
+        return blank_graph("Select a Pitch Type")
+    if clicked_info is None:
+        return blank_graph('Hover Over Point to see Fatigue Drop-Off for Date')
+    return plot_velo_fatigue(data, pitches_selected, flatten_list(clicked_info['points'][0]['customdata']), fatigue_col)
+
+
 @app.callback(
     Output('avg_tot_spin', 'figure'),
     Input("pitch_type_select", "value"),
     Input('statistic_select', 'value'),
+    Input('trend_window_select', 'value'),
 )
-def output_tot_spin(pitch_types, agg_label):
-    return plot_tot_spin(data, pitch_types, agg_meth_dict[agg_label], agg_label)
+def output_tot_spin(pitch_types, agg_label, trend_label):
+    return plot_tot_spin(data, pitch_types, agg_label, **trend_window_dict[trend_label])
 
 
 @app.callback(
     Output('avg_true_spin', 'figure'),
     Input("pitch_type_select", "value"),
     Input('statistic_select', 'value'),
+    Input('trend_window_select', 'value'),
 )
-def output_true_spin(pitch_types, agg_label):
-    return plot_true_spin(data, pitch_types, agg_meth_dict[agg_label], agg_label)
+def output_true_spin(pitch_types, agg_label, trend_label):
+    return plot_true_spin(data, pitch_types, agg_label, **trend_window_dict[trend_label])
 
 
 @app.callback(
     Output('avg_spin_eff', 'figure'),
     Input("pitch_type_select", "value"),
     Input('statistic_select', 'value'),
+    Input('trend_window_select', 'value'),
 )
-def output_eff_spin(pitch_types, agg_label):
-    return plot_eff_spin(data, pitch_types, agg_meth_dict[agg_label], agg_label)
+def output_eff_spin(pitch_types, agg_label, trend_label):
+    return plot_eff_spin(data, pitch_types, agg_label, **trend_window_dict[trend_label])
 
 break_layout = html.Div(
         [
@@ -119,9 +145,33 @@ velo_layout = html.Div(
                 style={'width': '80vw', 'height': '45vh', 'margin': 0, 'display': 'inline-block'},
                 clear_on_unhover=True
             ),
-            dcc.Graph(
-                id='velo',
-                style={'width': '80vw', 'height': '45vh', 'margin': 0, 'display': 'inline-block'}
+            html.Div(
+                [
+                    dcc.Graph(
+                        id='velo',
+                        style={'width': '40vw', 'height': '45vh', 'margin': 0, 'display': 'inline-block'}
+                    ),
+                    html.Div(
+                        [
+                            dcc.Dropdown(
+                                id='fatigue_metric_select',
+                                style={'width': '10vw', 'height': 'auto', 'margin': 0, 'padding': 5},
+                                value='MPH',
+                                options=[
+                                    {'label': 'MPH', 'value': 'MPH'},
+                                    {'label': 'Total Spin', 'value': 'Total_Spin'},
+                                    {'label': 'Spin Efficiency', 'value': 'Spin_Efficiency'},
+                                ]
+                            ),
+                            dcc.Graph(
+                                id='velo_fatigue',
+                                style={'width': '40vw', 'height': '40vh', 'margin': 0, 'display': 'inline-block'}
+                            )
+                        ],
+                        style={'display': 'flex', 'flex-direction': 'column'}
+                    )
+                ],
+                style={'display': 'flex', 'flex-direction': 'row'}
             )
         ],
         style={'display': 'flex', 'flex-direction': 'column', 'padding': 5, 'width': 'auto', 'height': '1000'}
@@ -167,7 +217,7 @@ app.layout = html.Div(
                             html.H6(children="Select Pitch Types:"),
                             dcc.Checklist(
                                 id='pitch_type_select',
-                                options=data['Pitch_Type'].unique(),
+                                options=get_pitch_types(data),
                                 inline=False,
                                 style={'width': '10vw', 'height': 'auto', 'margin': 10, 'padding': 5},
                                 labelStyle={'display': 'block'}
@@ -182,6 +232,17 @@ app.layout = html.Div(
                                     'Max',
                                     'Median',
                                 ]
+                            ),
+                            html.H6(children="Select Trend Window:"),
+                            dcc.Dropdown(
+                                id='trend_window_select',
+                                style={'width': '10vw', 'height': 'auto', 'margin': 10, 'padding': 5},
+                                options=[
+                                    'Last 3 Sessions',
+                                    'Last 5 Sessions',
+                                    'Last 7 Days',
+                                    'Last 30 Days',
+                                ]
                             )
                         ],
                         style={'padding': 15}
@@ -0,0 +1,244 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from functions import (
+    FatigueDetector, RollingTrend, fatigue_stats, plot_avg_velo, plot_velo_fatigue, query_pitches, rolling_trend, session_agg, session_cols,
+    sql_table, var_stat
+)
+
+
+def session_data() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    frames = []
+
+    for date, athlete, drop, counted in [
+        ('2022-09-06', 'Martin', 4.0, True),
+        ('2022-09-22', 'Martin', 0.0, True),
+        ('2022-11-19', 'Martin', 3.0, False)
+    ]:
+        n = 30
+        mph = 75 + rng.normal(0, 0.8, n)
+        mph[n // 2:] -= drop
+        mph[3] = np.nan
+
+        frames.append(pd.DataFrame({
+            'Date': pd.to_datetime(date),
+            'Athlete_Name': athlete,
+            'Pitch_Type': np.where(np.arange(n) % 3 == 0, 'Slider', '4 Seam Fastball'),
+            'Pitch_Count': np.arange(1, n + 1) if counted else np.nan,
+            'MPH': mph
+        }))
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def pitch_data() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    n = 60
+
+    df = pd.DataFrame({
+        'Date': pd.to_datetime(rng.choice(['2022-09-06', '2022-09-22', '2022-11-19'], n)),
+        'Athlete_Name': rng.choice(['Martin', 'Jones'], n),
+        'Pitch_Type': rng.choice(['4 Seam Fastball', 'Curveball', 'Slider'], n),
+        'Pitch_Count': np.arange(1, n + 1),
+        'MPH': rng.normal(72, 4, n).round(1),
+        'Total_Spin': rng.integers(1800, 2400, n).astype(float)
+    })
+
+    # Single pitch sessions and a session with no recorded MPH
+    single = pd.DataFrame({
+        'Date': pd.to_datetime(['2022-12-04', '2022-12-04', '2022-12-10', '2022-12-10']),
+        'Athlete_Name': ['Martin', 'Jones', 'Martin', 'Martin'],
+        'Pitch_Type': ['Changeup', 'Changeup', 'Slider', 'Slider'],
+        'Pitch_Count': [1, 1, 1, 2],
+        'MPH': [68.2, 66.0, np.nan, np.nan],
+        'Total_Spin': [1900.0, 1850.0, 2100.0, 2150.0]
+    })
+
+    df = pd.concat([df, single], ignore_index=True)
+    df.loc[rng.choice(n, 8, replace=False), 'MPH'] = np.nan
+
+    return df
+
+
+def pitch_connection(df: pd.DataFrame) -> sqlite3.Connection:
+    con = sqlite3.connect(':memory:')
+    df.assign(Date=df['Date'].dt.strftime('%Y-%m-%d')).to_sql(sql_table, con, index=False)
+
+    return con
+
+
+@pytest.mark.parametrize('stat', ['Mean', 'Min', 'Max', 'Median', 'Q25', 'Q75'])
+def test_session_agg_sql_matches_pandas(stat):
+    df = pitch_data()
+    con = pitch_connection(df)
+    pitch_types = ['4 Seam Fastball', 'Changeup', 'Slider']
+    aggs = {f'{stat} MPH': 'MPH', f'{stat} Total Spin': 'Total_Spin'}
+
+    for group_cols in (session_cols, ['Date', 'Pitch_Type', 'Athlete_Name']):
+        pd.testing.assert_frame_equal(
+            session_agg(con, aggs, pitch_types, stat, group_cols),
+            session_agg(df, aggs, pitch_types, stat, group_cols),
+            check_dtype=False
+        )
+
+
+@pytest.mark.parametrize('col', ['MPH', 'Total_Spin'])
+def test_var_stat_sql_matches_pandas(col):
+    df = pitch_data()
+
+    pd.testing.assert_frame_equal(var_stat(pitch_connection(df), col), var_stat(df, col), check_dtype=False)
+
+
+def test_session_agg_sql_no_pitch_types():
+    df = pitch_data()
+    res = session_agg(pitch_connection(df), {'Mean MPH': 'MPH'}, [], 'Mean')
+
+    assert len(res) == 0
+    assert list(res.columns) == list(session_agg(df, {'Mean MPH': 'MPH'}, [], 'Mean').columns)
+
+
+def test_query_pitches_filters():
+    df = pitch_data()
+    cols = ['Date', 'Athlete_Name', 'Pitch_Type', 'Pitch_Count', 'MPH']
+
+    res = query_pitches(pitch_connection(df), cols, ['Slider', 'Curveball'], ['2022-09-22', '2022-12-10'], ['Martin'])
+    expected = df.loc[
+        df['Pitch_Type'].isin(['Slider', 'Curveball']) &
+        df['Date'].isin(pd.to_datetime(['2022-09-22', '2022-12-10'])) &
+        (df['Athlete_Name'] == 'Martin'),
+        cols
+    ].reset_index(drop=True)
+
+    assert len(expected) > 0
+    pd.testing.assert_frame_equal(res, expected, check_dtype=False)
+
+
+@pytest.mark.parametrize('warmup, k, h', [(5, 0.5, 4.0), (3, 0.25, 2.0)])
+def test_fatigue_detector_matches_fatigue_stats(warmup, k, h):
+    stats = fatigue_stats(session_data(), 'MPH', warmup, k, h)
+
+    for _, tmp in stats.groupby(session_cols):
+        detector = FatigueDetector(warmup, k, h)
+
+        for x, z, cusum, fatigue in zip(tmp['MPH'], tmp['MPH_z'], tmp['MPH_cusum'], tmp['MPH_fatigue']):
+            assert detector.update(x) == fatigue
+            assert detector.cusum == pytest.approx(cusum)
+            assert detector.z == pytest.approx(z, nan_ok=True)
+
+
+def test_fatigue_stats_flags_drop():
+    mph = np.tile([74.5, 75.0, 75.5], 10)
+    df = pd.DataFrame({
+        'Date': pd.to_datetime(['2022-09-06'] * 30 + ['2022-09-22'] * 30),
+        'Athlete_Name': 'Martin',
+        'Pitch_Type': '4 Seam Fastball',
+        'Pitch_Count': np.tile(np.arange(1, 31), 2),
+        'MPH': np.concatenate([np.where(np.arange(30) < 15, mph, mph - 3), mph])
+    })
+
+    stats = fatigue_stats(df, 'MPH')
+    flagged = stats.loc[stats['MPH_fatigue'], :]
+
+    assert (flagged['Date'] == pd.Timestamp('2022-09-06')).all()
+    assert flagged['Pitch_Number'].min() == 16
+
+
+@pytest.mark.parametrize('counted', [True, False])
+def test_plot_velo_fatigue_sql_matches_pandas(counted):
+    mph = np.tile([74.5, 75.0, 75.5], 12)
+    mph[18:] -= 3
+    pitch_types = np.where(np.arange(36) % 4 == 0, 'Changeup', '4 Seam Fastball')
+
+    df = pd.DataFrame({
+        'Date': pd.to_datetime(['2022-12-04'] * 36 + ['2022-12-10'] * 4),
+        'Athlete_Name': 'Martin',
+        'Pitch_Type': np.concatenate([pitch_types, ['Slider'] * 4]),
+        'Pitch_Count': np.arange(101, 141) if counted else np.nan,
+        'MPH': np.concatenate([mph, [70.0] * 4])
+    })
+    cust_data = ['2022-12-04', 'Martin', '4 Seam Fastball']
+
+    for pitches_selected in (['4 Seam Fastball'], ['4 Seam Fastball', 'Changeup']):
+        figs = [
+            plot_velo_fatigue(data, pitches_selected, cust_data, 'MPH', 'plotly')
+            for data in (df, pitch_connection(df))
+        ]
+        traces = [{trace.name: trace for trace in fig.data} for fig in figs]
+
+        assert traces[0].keys() == traces[1].keys()
+        assert np.asarray(traces[1]['4 Seam Fastball'].x).dtype == np.asarray(traces[0]['4 Seam Fastball'].x).dtype
+        for name in traces[0]:
+            np.testing.assert_allclose(np.asarray(traces[0][name].x, float), np.asarray(traces[1][name].x, float))
+            np.testing.assert_allclose(np.asarray(traces[0][name].y, float), np.asarray(traces[1][name].y, float))
+
+        # Pitch numbers are the place in the whole session, not among the selected pitch types
+        fastball = traces[0]['4 Seam Fastball']
+        first = 101 if counted else 1
+        assert list(fastball.x[:3]) == [first + 1, first + 2, first + 3]
+
+        flagged = traces[0]['4 Seam Fastball Fatigue']
+        assert len(flagged.x) > 0 and min(flagged.x) >= first + 18
+
+
+@pytest.mark.parametrize('window, days', [(1, None), (3, None), (None, 7), (None, 30)])
+def test_rolling_trend_matches_pandas_rolling(window, days):
+    rng = np.random.default_rng(0)
+    dates = pd.to_datetime('2022-09-01') + pd.to_timedelta(np.cumsum(rng.integers(1, 10, 20)), unit='D')
+
+    df = pd.concat([
+        pd.DataFrame({
+            'Date': dates,
+            'Athlete_Name': 'Martin',
+            'Pitch_Type': pitch_type,
+            'Mean MPH': rng.normal(mph, 2, len(dates))
+        })
+        for pitch_type, mph in [('4 Seam Fastball', 76), ('Curveball', 66)]
+    ], ignore_index=True)
+    df.loc[5, 'Mean MPH'] = np.nan
+
+    trend = rolling_trend(df.sample(frac=1, random_state=0), 'Mean MPH', window, days)
+
+    for _, tmp in trend.groupby(['Pitch_Type', 'Athlete_Name']):
+        if days is not None:
+            roll = tmp.rolling(f'{days}D', on='Date')['Mean MPH']
+        else:
+            roll = tmp['Mean MPH'].rolling(window, min_periods=1)
+
+        np.testing.assert_allclose(tmp['Mean MPH_trend_mean'], roll.mean())
+        np.testing.assert_allclose(tmp['Mean MPH_trend_std'], roll.std())
+
+
+@pytest.mark.parametrize('window, days', [(3, None), (None, 10)])
+def test_rolling_trend_append_matches_recompute(window, days):
+    rng = np.random.default_rng(0)
+    dates = pd.to_datetime('2022-09-01') + pd.to_timedelta(np.cumsum(rng.integers(1, 6, 40)), unit='D')
+    values = rng.normal(76, 2, len(dates))
+
+    trend = RollingTrend(window, days)
+    for date, value in zip(dates[:-1], values[:-1]):
+        trend.append(date, value)
+
+    mean, std = trend.append(dates[-1], values[-1])
+
+    if days is not None:
+        in_window = values[dates > dates[-1] - pd.Timedelta(days=days)]
+    else:
+        in_window = values[-window:]
+
+    assert mean == pytest.approx(np.mean(in_window))
+    assert std == pytest.approx(np.std(in_window, ddof=1))
+
+
+def test_trend_lines_named_by_athlete():
+    df = pitch_data()
+    pitch_types = ['4 Seam Fastball', 'Curveball']
+
+    fig = plot_avg_velo(df, pitch_types, 'Mean', 'plotly', trend_window=3)
+    names = [trace.name for trace in fig.data if trace.name is not None and 'Trend' in trace.name]
+
+    assert len(names) == len(set(names)) == 4
+    assert '4 Seam Fastball 3 Session Trend (Jones)' in names